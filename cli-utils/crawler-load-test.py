@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+# vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
+
+import sys
+import argparse
+from urllib import parse
+from windows11cpus import CpuScraper
+from windows11cpus.importer import AmdInfo, PageArchive
+from windows11cpus.loadtest import CrawlerLoadTest, CrawlerConfiguration, FixturePages, ThrottlingProfile
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def _setup_logger() -> None:
+    log_formatter = logging.Formatter("%(asctime)s [%(levelname)-5.5s]  %(message)s")
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setFormatter(log_formatter)
+    console_handler.propagate = False
+    logging.getLogger().addHandler(console_handler)
+    log.setLevel(logging.DEBUG)
+
+    # Crawlers log every CPU, too noisy for a load test
+    lib_log = logging.getLogger("windows11cpus")
+    lib_log.setLevel(logging.WARNING)
+    logging.getLogger("windows11cpus.loadtest").setLevel(logging.INFO)
+
+
+def _float_list(value: str) -> list:
+    return [float(item) for item in value.split(',')]
+
+
+def _int_list(value: str) -> list:
+    return [int(item) for item in value.split(',')]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Load test Intel/AMD crawlers against a local throttling server')
+    parser.add_argument('crawler', metavar='CRAWLER', choices=sorted(CrawlerLoadTest.CRAWLERS.keys()),
+                        help='Crawler to test: intel or amd.')
+    parser.add_argument('--archive', action='store_true',
+                        help='Serve real pages from page archive instead of synthetic ones.')
+    parser.add_argument('--intel-families', type=int, default=5,
+                        help='Synthetic pages: number of Intel CPU-families. Default: 5')
+    parser.add_argument('--cpus-per-family', type=int, default=10,
+                        help='Synthetic pages: number of CPUs in Intel family. Default: 10')
+    parser.add_argument('--amd-cpus', type=int, default=50,
+                        help='Synthetic pages: number of AMD CPUs. Default: 50')
+    parser.add_argument('--latency-distribution', default=ThrottlingProfile.LATENCY_LOGNORMAL,
+                        choices=ThrottlingProfile.LATENCY_DISTRIBUTIONS,
+                        help='Server latency distribution. Default: {}'.format(ThrottlingProfile.LATENCY_LOGNORMAL))
+    parser.add_argument('--latency-mean', type=float, default=0.05,
+                        help='Mean server latency in seconds. Default: 0.05')
+    parser.add_argument('--rate-limit', type=int,
+                        help='Respond 429 on more than this many requests per --window seconds.')
+    parser.add_argument('--block-after', type=int,
+                        help='AMD only: block with 403 on more than this many requests per --window seconds.')
+    parser.add_argument('--block-duration', type=float, default=600.0,
+                        help='Seconds to keep a blocked client blocked. Default: 600')
+    parser.add_argument('--window', type=float, default=60.0,
+                        help='Window for rate limiting and blocking in seconds. Default: 60')
+    parser.add_argument('--reset-probability', type=float, default=0.0,
+                        help='Probability of a connection reset. Default: 0')
+    parser.add_argument('--slow-body-probability', type=float, default=0.0,
+                        help='Probability of a slowly sent response body. Default: 0')
+    parser.add_argument('--slow-body-rate', type=int, default=4096,
+                        help='Bytes per second of a slow body. Default: 4096')
+    parser.add_argument('--seed', type=int,
+                        help='Random seed for repeatable runs.')
+    parser.add_argument('--workers', type=_int_list, default=[1],
+                        help='Comma-separated list of parallel crawler counts to test. Default: 1')
+    parser.add_argument('--request-delays', type=_float_list,
+                        help="Comma-separated list of delays between requests to test. Default: crawler's own")
+    parser.add_argument('--load-timeout', type=float,
+                        help="Request timeout in seconds. Default: crawler's own")
+
+    args = parser.parse_args()
+    _setup_logger()
+
+    if args.archive:
+        archive = PageArchive("{}/{}".format(CpuScraper.data_dir, CpuScraper.archive_dirname))
+        pages = FixturePages.from_archive(archive)
+        archive.close()
+    else:
+        pages = FixturePages.generate(args.intel_families, args.cpus_per_family, args.amd_cpus)
+    log.info("Serving {} fixture pages".format(len(pages)))
+
+    default_profile = ThrottlingProfile(latency_distribution=args.latency_distribution,
+                                        latency_mean=args.latency_mean,
+                                        rate_limit_requests=args.rate_limit, rate_limit_window=args.window,
+                                        reset_probability=args.reset_probability,
+                                        slow_body_probability=args.slow_body_probability,
+                                        slow_body_bytes_per_second=args.slow_body_rate)
+    amd_profile = ThrottlingProfile(latency_distribution=args.latency_distribution,
+                                    latency_mean=args.latency_mean,
+                                    rate_limit_requests=args.rate_limit, rate_limit_window=args.window,
+                                    block_after_requests=args.block_after, block_window=args.window,
+                                    block_duration=args.block_duration,
+                                    reset_probability=args.reset_probability,
+                                    slow_body_probability=args.slow_body_probability,
+                                    slow_body_bytes_per_second=args.slow_body_rate)
+    # AMD's Application Gateway covers all of their pages
+    amd_paths = (parse.urlparse(AmdInfo.PROCESSORS_URL).path,
+                 parse.urlparse(AmdInfo.PROCESSOR_INFO_URL.format('')).path)
+    profiles = {path: amd_profile for path in amd_paths}
+
+    configurations = []
+    for workers in args.workers:
+        for request_delay in args.request_delays or [None]:
+            name = "{}x{}".format(workers, "default" if request_delay is None else request_delay)
+            configurations.append(CrawlerConfiguration(name, workers, request_delay, args.load_timeout))
+
+    load_test = CrawlerLoadTest(pages, profiles, default_profile, args.seed)
+    reports = load_test.run_all(args.crawler, configurations)
+    print(CrawlerLoadTest.format_reports(reports))
+
+
+if __name__ == '__main__':
+    main()
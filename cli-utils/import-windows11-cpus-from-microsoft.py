@@ -3,20 +3,25 @@
 # vim: autoindent tabstop=4 shiftwidth=4 expandtab softtabstop=4 filetype=python
 
 import sys
+import signal
 import argparse
 import pickle
 from typing import Tuple
 import re
 from datetime import datetime
+from urllib import parse
 from googleapiclient.discovery import build, Resource
 from google.oauth2 import service_account
-from windows11cpus import CpuScraper
+from windows11cpus import CpuScraper, CpuExporter
+from windows11cpus.importer import AmdInfo, PageArchive, RefreshDaemon
 import logging
 
 log = logging.getLogger(__name__)
 
 ACTION_SCRAPE = "scrape"
 ACTION_UPLOAD = "upload"
+ACTION_REPARSE = "reparse"
+ACTION_DAEMON = "daemon"
 
 
 def _setup_logger() -> None:
@@ -32,12 +37,20 @@ def _setup_logger() -> None:
     lib_log.setLevel(logging.DEBUG)
 
 
-def scrape(credentials_file: str = None, shared_owner_email: str = None) -> None:
-    # Scrape Microsoft compatibility list
-    cpus = CpuScraper.scrape_win11_cpus()
+def scrape(credentials_file: str = None, shared_owner_email: str = None,
+           export_dir: str = None, export_format: str = CpuExporter.FORMAT_CSV,
+           export_compression: str = CpuExporter.COMPRESSION_GZIP, archive: PageArchive = None,
+           force_vendors: bool = False) -> None:
+    if archive:
+        # Re-parse previously archived pages
+        cpus, vendor_cpus = CpuScraper.parse_archive(archive)
+    else:
+        # Scrape Microsoft compatibility list
+        cpus = CpuScraper.scrape_win11_cpus()
 
-    # This should be a simple load instead of a slow scraping-operation.
-    vendor_cpus = CpuScraper.scrape_vendors()
+        # This should be a simple load instead of a slow scraping-operation.
+        # Unless forced, ie. vendor pages need to be fetched for the page archive.
+        vendor_cpus = CpuScraper.scrape_vendors(force=force_vendors)
 
     # Prepare the list
     amd_cpu_titles = [(cpu_idx, cpu[0]) for cpu_idx, cpu in enumerate(vendor_cpus['AMD'])]
@@ -145,10 +158,15 @@ def scrape(credentials_file: str = None, shared_owner_email: str = None) -> None
     for quartal in sorted(quartals[vendor].keys()):
         log.info("{}\t{}\t{}".format(quartal, quartals[vendor][quartal][0], quartals[vendor][quartal][1]))
 
+    header_row = CpuExporter.ENRICHED_HEADER_ROW
+
+    # --> to files
+    if export_dir:
+        exporter = CpuExporter(header_row, export_format, export_compression)
+        exporter.export_vendors(export_dir, enriched_vendor_cpus)
+
     # --> to Google Spreadsheet
     if credentials_file and shared_owner_email:
-        header_row = (
-        'Processor Title', 'Processor Number', 'Win11', 'Launch', 'Launch Q', 'Family', 'URL to information')
         upload_to_google(credentials_file, enriched_vendor_cpus, header_row, "Vendor enriched CPU-lists",
                          shared_owner_email)
 
@@ -386,12 +404,33 @@ def _confirm_spreadsheet_existence(drive_service: Resource, sheets_service: Reso
 def main() -> None:
     parser = argparse.ArgumentParser(description='Windows 11 CPU information scraper')
     parser.add_argument('action', metavar='ACTION-TO-DO',
-                        help='Mandatory action to do: scrape or upload.')
+                        help='Mandatory action to do: scrape, reparse, daemon or upload.')
     parser.add_argument('--google-credentials', metavar='GOOGLE-JSON-CREDENTIALS-FILE',
                         help='JSON-file with Google Sheets API Service Account credentials.')
     parser.add_argument('--spreadsheet-co-owner-email', metavar='GOOGLE-DRIVE-USER-EMAIL',
                         help='Service account will create a Spreadsheet into Google Drive. '
                              'It needs to be shared with a human.')
+    parser.add_argument('--export-dir', metavar='DIRECTORY',
+                        help='Export enriched CPU-lists into files in given directory.')
+    parser.add_argument('--export-format', default=CpuExporter.FORMAT_CSV, choices=CpuExporter.FORMATS,
+                        help='File format for export. Default: {}'.format(CpuExporter.FORMAT_CSV))
+    parser.add_argument('--export-compression', default=CpuExporter.COMPRESSION_GZIP,
+                        choices=CpuExporter.COMPRESSIONS,
+                        help='Compression for exported files. Default: {}'.format(CpuExporter.COMPRESSION_GZIP))
+    parser.add_argument('--archive-pages', action='store_true',
+                        help='Store all fetched pages into page archive for reparse.')
+    parser.add_argument('--requests-per-hour', type=int, default=RefreshDaemon.REQUESTS_PER_HOUR,
+                        help='Daemon: max. requests per hour to a single host. Default: {}'.format(
+                            RefreshDaemon.REQUESTS_PER_HOUR))
+    parser.add_argument('--amd-requests-per-hour', type=int,
+                        help='Daemon: max. requests per hour to AMD. Default: same as --requests-per-hour')
+    parser.add_argument('--microsoft-refresh-hours', type=float,
+                        default=RefreshDaemon.MICROSOFT_INTERVAL / 3600,
+                        help='Daemon: refresh Microsoft lists this often. Default: {}'.format(
+                            RefreshDaemon.MICROSOFT_INTERVAL / 3600))
+    parser.add_argument('--cpu-refresh-hours', type=float, default=RefreshDaemon.CPU_MIN_AGE / 3600,
+                        help='Daemon: minimum age of CPU information before refresh. Default: {}'.format(
+                            RefreshDaemon.CPU_MIN_AGE / 3600))
 
     args = parser.parse_args()
     _setup_logger()
@@ -407,8 +446,46 @@ def main() -> None:
         upload_to_google(args.google_credentials, vendor_cpus, "Vendor CPU-lists", args.spreadsheet_co_owner_email)
         log.info("Done uploading.")
     elif args.action == ACTION_SCRAPE:
-        scrape(args.google_credentials, args.spreadsheet_co_owner_email)
+        if args.archive_pages:
+            PageArchive.start_recording("{}/{}".format(CpuScraper.data_dir, CpuScraper.archive_dirname))
+        try:
+            # Vendor pages are archived only if they're actually crawled
+            scrape(args.google_credentials, args.spreadsheet_co_owner_email,
+                   args.export_dir, args.export_format, args.export_compression,
+                   force_vendors=args.archive_pages)
+        finally:
+            PageArchive.stop_recording()
         log.info("Done scraping.")
+    elif args.action == ACTION_REPARSE:
+        archive = PageArchive("{}/{}".format(CpuScraper.data_dir, CpuScraper.archive_dirname))
+        try:
+            scrape(args.google_credentials, args.spreadsheet_co_owner_email,
+                   args.export_dir, args.export_format, args.export_compression, archive)
+        finally:
+            archive.close()
+        log.info("Done reparsing.")
+    elif args.action == ACTION_DAEMON:
+        host_requests_per_hour = {}
+        if args.amd_requests_per_hour:
+            host_requests_per_hour[parse.urlparse(AmdInfo.PROCESSORS_URL).netloc] = args.amd_requests_per_hour
+        if args.archive_pages:
+            PageArchive.start_recording("{}/{}".format(CpuScraper.data_dir, CpuScraper.archive_dirname))
+        daemon = RefreshDaemon(requests_per_hour=args.requests_per_hour,
+                               host_requests_per_hour=host_requests_per_hour,
+                               microsoft_interval=args.microsoft_refresh_hours * 3600,
+                               cpu_min_age=args.cpu_refresh_hours * 3600)
+
+        def _stop(signum, frame) -> None:
+            # Service managers stop with SIGTERM, handle it like Ctrl-C to save state on the way out
+            raise KeyboardInterrupt()
+
+        signal.signal(signal.SIGTERM, _stop)
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            log.info("Stopping refresh daemon.")
+        finally:
+            PageArchive.stop_recording()
     else:
         parser.print_help()
         exit(1)
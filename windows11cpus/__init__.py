@@ -1,3 +1,4 @@
 from .importer import CpuScraper
+from .exporter import CpuExporter
 
-__all__ = ['CpuScraper']
+__all__ = ['CpuScraper', 'CpuExporter']
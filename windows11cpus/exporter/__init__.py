@@ -0,0 +1,3 @@
+from .cpu_exporter import CpuExporter
+
+__all__ = ['CpuExporter']
@@ -0,0 +1,182 @@
+import os
+import csv
+import io
+import gzip
+import json
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional
+import logging
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+log = logging.getLogger(__name__)
+
+
+class CpuExporter:
+    FORMAT_CSV = "csv"
+    FORMAT_JSONL = "jsonl"
+    FORMAT_PARQUET = "parquet"
+    FORMATS = (FORMAT_CSV, FORMAT_JSONL, FORMAT_PARQUET)
+
+    COMPRESSION_NONE = "none"
+    COMPRESSION_GZIP = "gzip"
+    COMPRESSION_ZSTD = "zstd"
+    COMPRESSIONS = (COMPRESSION_NONE, COMPRESSION_GZIP, COMPRESSION_ZSTD)
+
+    # Same columns as the vendor enriched Google Spreadsheet
+    ENRICHED_HEADER_ROW = (
+        'Processor Title', 'Processor Number', 'Win11', 'Launch', 'Launch Q', 'Family', 'URL to information'
+    )
+
+    # Parquet is columnar, rows are buffered into row groups of this size
+    PARQUET_ROW_GROUP_SIZE = 1000
+
+    def __init__(self, header_row: tuple = ENRICHED_HEADER_ROW, export_format: str = FORMAT_CSV,
+                 compression: str = COMPRESSION_GZIP):
+        if export_format not in CpuExporter.FORMATS:
+            raise ValueError("Don't know export format {}!".format(export_format))
+        if compression not in CpuExporter.COMPRESSIONS:
+            raise ValueError("Don't know compression {}!".format(compression))
+        # Parquet compresses natively in pyarrow, only CSV and JSON Lines need zstandard
+        if (compression == CpuExporter.COMPRESSION_ZSTD and export_format != CpuExporter.FORMAT_PARQUET
+                and not zstandard):
+            raise RuntimeError("zstd compression requires zstandard-package!")
+        if export_format == CpuExporter.FORMAT_PARQUET and not pyarrow:
+            raise RuntimeError("Parquet export requires pyarrow-package!")
+
+        self.header_row = header_row
+        self.export_format = export_format
+        self.compression = compression
+
+    def filename_for(self, output_dir: str, name: str) -> str:
+        if self.export_format == CpuExporter.FORMAT_PARQUET:
+            # Parquet does its own compression per column chunk
+            return "{}/{}.parquet".format(output_dir, name)
+        extension = self.export_format
+        if self.compression == CpuExporter.COMPRESSION_GZIP:
+            extension += ".gz"
+        elif self.compression == CpuExporter.COMPRESSION_ZSTD:
+            extension += ".zst"
+
+        return "{}/{}.{}".format(output_dir, name, extension)
+
+    def export_vendors(self, output_dir: str, vendor_cpus: dict) -> list:
+        os.makedirs(output_dir, exist_ok=True)
+        filenames = []
+        for vendor in vendor_cpus:
+            filename = self.filename_for(output_dir, "{}-cpus".format(vendor.lower()))
+            row_count = self.export(filename, vendor_cpus[vendor])
+            log.info("Exported {} {} CPUs into {}".format(row_count, vendor, filename))
+            filenames.append(filename)
+
+        return filenames
+
+    def export(self, filename: str, rows: Iterable) -> int:
+        # Rows may be any iterable, including a generator.
+        # Nothing but the current row (or Parquet row group) is kept in memory.
+        if self.export_format == CpuExporter.FORMAT_PARQUET:
+            return self._export_parquet(filename, rows)
+
+        with self._open_binary(filename) as binary_out:
+            text_out = io.TextIOWrapper(binary_out, encoding='utf-8', newline='')
+            try:
+                if self.export_format == CpuExporter.FORMAT_CSV:
+                    row_count = self._write_csv(text_out, rows)
+                else:
+                    row_count = self._write_jsonl(text_out, rows)
+            finally:
+                text_out.flush()
+                text_out.detach()
+
+        return row_count
+
+    def _open_binary(self, filename: str):
+        if self.compression == CpuExporter.COMPRESSION_GZIP:
+            return gzip.open(filename, 'wb')
+        if self.compression == CpuExporter.COMPRESSION_ZSTD:
+            return zstandard.open(filename, 'wb')
+
+        return open(filename, 'wb')
+
+    def _write_csv(self, text_out: io.TextIOBase, rows: Iterable) -> int:
+        writer = csv.writer(text_out)
+        writer.writerow(self.header_row)
+        row_count = 0
+        for row in self._check_rows(rows):
+            writer.writerow(row)
+            row_count += 1
+
+        return row_count
+
+    def _write_jsonl(self, text_out: io.TextIOBase, rows: Iterable) -> int:
+        row_count = 0
+        for row in self._check_rows(rows):
+            record = dict(zip(self.header_row, row))
+            text_out.write(json.dumps(record, ensure_ascii=False, default=CpuExporter._json_default))
+            text_out.write("\n")
+            row_count += 1
+
+        return row_count
+
+    def _export_parquet(self, filename: str, rows: Iterable) -> int:
+        writer = None
+        columns = None
+        row_count = 0
+        try:
+            for row in self._check_rows(rows):
+                if columns is None:
+                    columns = [[] for _ in self.header_row]
+                for column_idx, value in enumerate(row):
+                    columns[column_idx].append(value)
+                row_count += 1
+                if len(columns[0]) >= CpuExporter.PARQUET_ROW_GROUP_SIZE:
+                    writer = self._write_parquet_row_group(filename, writer, columns)
+                    columns = None
+            if columns or not writer:
+                writer = self._write_parquet_row_group(filename, writer,
+                                                       columns or [[] for _ in self.header_row])
+        finally:
+            if writer:
+                writer.close()
+
+        return row_count
+
+    def _write_parquet_row_group(self, filename: str, writer: Optional["pyarrow.parquet.ParquetWriter"],
+                                 columns: list) -> "pyarrow.parquet.ParquetWriter":
+        if writer:
+            # Schema was fixed by the first row group
+            table = pyarrow.Table.from_arrays(columns, schema=writer.schema)
+        else:
+            table = pyarrow.Table.from_arrays(columns, names=list(self.header_row))
+            # A column without any values in the first row group would get null-type.
+            # Legacy CPUs don't have a number or launch quarter, assume text.
+            schema = pyarrow.schema([pyarrow.field(field.name, pyarrow.string()) if pyarrow.types.is_null(field.type)
+                                     else field for field in table.schema])
+            table = table.cast(schema)
+            compression = self.compression if self.compression != CpuExporter.COMPRESSION_NONE else None
+            writer = pyarrow.parquet.ParquetWriter(filename, table.schema, compression=compression)
+        writer.write_table(table)
+
+        return writer
+
+    def _check_rows(self, rows: Iterable) -> Iterator[tuple]:
+        for row in rows:
+            if len(row) != len(self.header_row):
+                raise ValueError("Invalid data row! Expected {} columns, got {}.".format(
+                    len(self.header_row), len(row)))
+            yield row
+
+    @staticmethod
+    def _json_default(value):
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()
+
+        raise TypeError("Cannot serialize {} into JSON!".format(type(value).__name__))
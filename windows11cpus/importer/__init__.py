@@ -1,5 +1,8 @@
 from .scrape_cpu_lists import CpuScraper
 from .intel import IntelInfo
 from .amd import AmdInfo
+from .page_fingerprints import PageFingerprints
+from .page_archive import PageArchive
+from .refresh_daemon import RefreshDaemon
 
-__all__ = ['CpuScraper', 'IntelInfo', 'AmdInfo']
+__all__ = ['CpuScraper', 'IntelInfo', 'AmdInfo', 'PageFingerprints', 'PageArchive', 'RefreshDaemon']
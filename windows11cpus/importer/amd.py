@@ -2,6 +2,8 @@ import requests
 from bs4 import BeautifulSoup
 import re
 from time import sleep
+from .page_fingerprints import PageFingerprints
+from .page_archive import PageArchive
 import logging
 
 log = logging.getLogger(__name__)
@@ -9,15 +11,31 @@ log = logging.getLogger(__name__)
 
 class AmdInfo:
     LOAD_TIMEOUT = 15.0
+    # AMD don't want us making that many requests.
+    # Their Application Gateway will block the IPv4 on any attempts to crawl their site.
+    REQUEST_DELAY = 1.5
     PROCESSORS_URL = "https://www.amd.com/en/products/specifications/processors"
     PROCESSOR_INFO_URL = "https://www.amd.com/en/product/{}"
     USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:92.0) Gecko/20100101 Firefox/92.0"
 
     @staticmethod
     def scrape() -> list:
-        list_url = AmdInfo.PROCESSORS_URL
-        log.debug("Get AMD CPU-family information from {}".format(list_url))
+        sess = AmdInfo.session()
+        all_cpus = []
+        for processor_id in AmdInfo.list_processor_ids(sess):
+            try:
+                cpu_data = AmdInfo._scrape_cpu(sess, processor_id)
+                sleep(AmdInfo.REQUEST_DELAY)
+            except Exception:
+                log.exception("Loading AMD CPU-info for ID {} failed!".format(processor_id))
+                raise
+            log.info("AMD CPU-family: {}, CPU: {}".format(cpu_data[3], cpu_data[0]))
+            all_cpus.append(cpu_data)
+
+        return all_cpus
 
+    @staticmethod
+    def session() -> requests.Session:
         sess = requests.session()
         if False:
             my_cookie = {
@@ -45,10 +63,25 @@ class AmdInfo:
             'User-Agent': AmdInfo.USER_AGENT,
         }
         sess.headers.update(headers)
+
+        return sess
+
+    @staticmethod
+    def list_processor_ids(sess: requests.Session) -> list:
+        list_url = AmdInfo.PROCESSORS_URL
+        log.debug("Get AMD CPU-family information from {}".format(list_url))
         r = sess.get(list_url, timeout=AmdInfo.LOAD_TIMEOUT)
-        parsed_html = BeautifulSoup(r.content, "html.parser")
+        PageArchive.record(list_url, r)
+        # Throttled or error page would parse into no processors at all
+        r.raise_for_status()
+
+        return AmdInfo._parse_processor_ids(r.content)
+
+    @staticmethod
+    def _parse_processor_ids(content: bytes) -> list:
+        parsed_html = BeautifulSoup(content, "html.parser")
         spec_table = parsed_html.find('table', id='spec-table').find('tbody')
-        all_cpus = []
+        processor_ids = []
         for table_row in spec_table.find_all('tr'):
             cpu_name_column = table_row.find('td', {"headers": "view-name-table-column"})
             cpu_title = cpu_name_column.text
@@ -60,25 +93,27 @@ class AmdInfo:
                     break
             if not processor_id:
                 raise ValueError("AMD CPU {} does not have id!".format(cpu_title))
+            processor_ids.append(processor_id)
 
-            try:
-                cpu_data = AmdInfo._scrape_cpu(sess, processor_id)
-                # AMD don't want us making that many requests.
-                # Their Application Gateway will block the IPv4 on any attempts to crawl their site.
-                sleep(1.5)
-            except Exception:
-                log.exception("Loading AMD CPU-info for ID {} failed!".format(processor_id))
-                raise
-            log.info("AMD CPU-family: {}, CPU: {}".format(cpu_data[3], cpu_data[0]))
-            all_cpus.append(cpu_data)
-
-        return all_cpus
+        return processor_ids
 
     @staticmethod
     def _scrape_cpu(sess: requests.Session, processor_id: str) -> tuple:
         cpu_url = AmdInfo.PROCESSOR_INFO_URL.format(processor_id)
         r = sess.get(cpu_url, timeout=AmdInfo.LOAD_TIMEOUT)
-        parsed_html = BeautifulSoup(r.content, "html.parser")
+        PageArchive.record(cpu_url, r)
+        fingerprint, cpu_data = PageFingerprints.lookup(cpu_url, r.content)
+        if cpu_data:
+            # Page is unchanged since last time, no need to parse it again
+            return cpu_data
+        cpu_data = AmdInfo._parse_cpu(cpu_url, r.content)
+        PageFingerprints.remember(cpu_url, fingerprint, cpu_data)
+
+        return cpu_data
+
+    @staticmethod
+    def _parse_cpu(cpu_url: str, content: bytes) -> tuple:
+        parsed_html = BeautifulSoup(content, "html.parser")
         title_html = parsed_html.find('div', id="block-amd-page-title").find('h2')
         cpu_title = title_html.text
         cpu_number = None
@@ -106,3 +141,21 @@ class AmdInfo:
         )
 
         return new_data
+
+    @staticmethod
+    def parse_archive(archive: PageArchive) -> list:
+        # Offline: walk the archived processor listing like scrape() does and re-run the parsers
+        list_url = AmdInfo.PROCESSORS_URL
+        if list_url not in archive:
+            raise FileNotFoundError("AMD processor listing {} is not archived!".format(list_url))
+        all_cpus = []
+        for processor_id in AmdInfo._parse_processor_ids(archive.get(list_url)):
+            cpu_url = AmdInfo.PROCESSOR_INFO_URL.format(processor_id)
+            try:
+                cpu_data = AmdInfo._parse_cpu(cpu_url, archive.get(cpu_url))
+            except Exception:
+                log.exception("Parsing archived AMD CPU-info from {} failed!".format(cpu_url))
+                raise
+            all_cpus.append(cpu_data)
+
+        return all_cpus
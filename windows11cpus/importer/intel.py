@@ -1,12 +1,18 @@
 import requests
 from bs4 import BeautifulSoup
 from urllib import parse
+from time import sleep
+from .page_fingerprints import PageFingerprints
+from .page_archive import PageArchive
 import logging
 
 log = logging.getLogger(__name__)
 
 
 class IntelInfo:
+    LOAD_TIMEOUT = 15.0
+    # Pause between CPU-info pages, ARK doesn't need any
+    REQUEST_DELAY = 0.0
     SEARCH_URL = "https://ark.intel.com/content/www/us/en/ark/search.html?_charset_=UTF-8&q={}"
     PROCESSORS_URL = "https://ark.intel.com/content/www/us/en/ark.html#@Processors"
 
@@ -18,7 +24,8 @@ class IntelInfo:
         search_url = IntelInfo.SEARCH_URL.format(data[2])
         base_url_parsed = parse.urlparse(search_url)
         log.debug("Get Intel CPU information for {} from {}".format(data[2], search_url))
-        r = requests.get(search_url)
+        r = requests.get(search_url, timeout=IntelInfo.LOAD_TIMEOUT)
+        PageArchive.record(search_url, r)
 
         # Check search result
         parsed_html = BeautifulSoup(r.content, "html.parser")
@@ -37,15 +44,26 @@ class IntelInfo:
     @staticmethod
     def _get_cpu_info(cpu_url: str) -> tuple:
         # Get the CPU-info
-        r = requests.get(cpu_url)
+        r = requests.get(cpu_url, timeout=IntelInfo.LOAD_TIMEOUT)
+        PageArchive.record(cpu_url, r)
+        fingerprint, cpu_data = PageFingerprints.lookup(cpu_url, r.content)
+        if cpu_data:
+            # Page is unchanged since last time, no need to parse it again
+            return cpu_data
+        cpu_data = IntelInfo._parse_cpu_info(cpu_url, r.content)
+        PageFingerprints.remember(cpu_url, fingerprint, cpu_data)
 
+        return cpu_data
+
+    @staticmethod
+    def _parse_cpu_info(cpu_url: str, content: bytes) -> tuple:
         # <h1 class="h1">Intel Atom® x6427FE Processor </h1>
         # <span class="value" data-key="ProcessorNumber">6427FE</span>
         # <span class="value" data-key="BornOnDate">Q1'21</span>
         # <span class="value" data-key="ProductGroup">
         #   <a href="/content/www/us/en/ark/products/series/87465/intel-atom-processor-x-series.html" class="ark-accessible-color hrefcolor">Intel Atom® Processor X Series</a>
         # </span>
-        parsed_html = BeautifulSoup(r.content, "html.parser")
+        parsed_html = BeautifulSoup(content, "html.parser")
         cpu_title_html = parsed_html.find('h1', {"class": "h1"})
         cpu_number_html = parsed_html.find('span', {"class": "value", "data-key": "ProcessorNumber"})
         cpu_launch_html = parsed_html.find('span', {"class": "value", "data-key": "BornOnDate"})
@@ -73,13 +91,49 @@ class IntelInfo:
 
         return new_data
 
+    @staticmethod
+    def parse_archive(archive: PageArchive) -> list:
+        # Offline: walk archived family listings like scrape() does and re-run the parsers
+        families_url = IntelInfo.PROCESSORS_URL
+        if families_url not in archive:
+            raise FileNotFoundError("Intel CPU-families page {} is not archived!".format(families_url))
+        all_cpus = []
+        for family_name, family_url in IntelInfo._parse_families(families_url, archive.get(families_url)):
+            for cpu_url in IntelInfo._parse_family_cpu_urls(family_url, archive.get(family_url)):
+                try:
+                    cpu_data = IntelInfo._parse_cpu_info(cpu_url, archive.get(cpu_url))
+                except Exception:
+                    log.exception("Parsing archived Intel CPU-info from {} failed!".format(cpu_url))
+                    raise
+                all_cpus.append(cpu_data)
+
+        return all_cpus
+
     @staticmethod
     def scrape() -> list:
+        all_cpus = []
+        for family_name, family_url in IntelInfo.list_families():
+            log.debug("Got Intel CPU-family {}".format(family_name))
+            family_cpus = IntelInfo._scrape_family(family_name, family_url)
+            all_cpus.extend(family_cpus)
+
+        return all_cpus
+
+    @staticmethod
+    def list_families() -> list:
         families_url = IntelInfo.PROCESSORS_URL
-        base_url_parsed = parse.urlparse(families_url)
         log.debug("Get Intel CPU-family information from {}".format(families_url))
-        r = requests.get(families_url)
-        parsed_html = BeautifulSoup(r.content, "html.parser")
+        r = requests.get(families_url, timeout=IntelInfo.LOAD_TIMEOUT)
+        PageArchive.record(families_url, r)
+        # Throttled or error page would parse into no families at all
+        r.raise_for_status()
+
+        return IntelInfo._parse_families(families_url, r.content)
+
+    @staticmethod
+    def _parse_families(families_url: str, content: bytes) -> list:
+        base_url_parsed = parse.urlparse(families_url)
+        parsed_html = BeautifulSoup(content, "html.parser")
         if False:
             cpu_launch_html = parsed_html.find('div', {"data-parent-panel-key": "Processors"})
             families = cpu_launch_html.find_all('div', {"class": "Processors", "data-wap_ref": "category|subcategory"})
@@ -109,7 +163,7 @@ class IntelInfo:
         cpu_blocks7 = parsed_html.find_all('div',
                                            {"class": "products processors", "data-parent-panel-key": "PanelLabel29035"})
         cpu_blocks = [cpu_blocks1, cpu_blocks2, cpu_blocks3, cpu_blocks4, cpu_blocks5, cpu_blocks6, cpu_blocks7]
-        all_cpus = []
+        families = []
         for family_block in [item for sublist in cpu_blocks for item in sublist]:
             for family in family_block.find_all('a'):
                 family_name = family.text
@@ -117,20 +171,41 @@ class IntelInfo:
                 family_link_parts = parse.ParseResult(scheme=base_url_parsed.scheme, netloc=base_url_parsed.netloc,
                                                       path=link, params=None, query=None, fragment=None)
                 family_url = parse.urlunparse(family_link_parts)
-                log.debug("Got Intel CPU-family {}".format(family_name))
-                family_cpus = IntelInfo._scrape_family(family_name, family_url)
-                all_cpus.extend(family_cpus)
+                families.append((family_name, family_url))
 
-        return all_cpus
+        return families
 
     @staticmethod
     def _scrape_family(family_name: str, family_url: str) -> list:
+        all_cpus = []
+        for cpu_url in IntelInfo.list_family_cpu_urls(family_url):
+            try:
+                cpu_data = IntelInfo._get_cpu_info(cpu_url)
+            except Exception:
+                log.exception("Loading Intel CPU-info from {} failed!".format(cpu_url))
+                raise
+            log.info("Intel CPU-family: {}, CPU: {}".format(family_name, cpu_data[0]))
+            all_cpus.append(cpu_data)
+            if IntelInfo.REQUEST_DELAY:
+                sleep(IntelInfo.REQUEST_DELAY)
+
+        return all_cpus
+
+    @staticmethod
+    def list_family_cpu_urls(family_url: str) -> list:
+        r = requests.get(family_url, timeout=IntelInfo.LOAD_TIMEOUT)
+        PageArchive.record(family_url, r)
+        r.raise_for_status()
+
+        return IntelInfo._parse_family_cpu_urls(family_url, r.content)
+
+    @staticmethod
+    def _parse_family_cpu_urls(family_url: str, content: bytes) -> list:
         base_url_parsed = parse.urlparse(family_url)
-        r = requests.get(family_url)
-        parsed_html = BeautifulSoup(r.content, "html.parser")
+        parsed_html = BeautifulSoup(content, "html.parser")
         cpu_table = parsed_html.find('table', id="product-table").find('tbody')
 
-        all_cpus = []
+        cpu_urls = []
         for cpu_row in cpu_table.find_all('tr'):
             cpu_cell = cpu_row.find('td', {"data-component": "arkproductlink"})
             cpu_link_html = cpu_cell.find('a')
@@ -138,12 +213,6 @@ class IntelInfo:
             cpu_link_parts = parse.ParseResult(scheme=base_url_parsed.scheme, netloc=base_url_parsed.netloc,
                                                path=cpu_link, params=None, query=None, fragment=None)
             cpu_url = parse.urlunparse(cpu_link_parts)
-            try:
-                cpu_data = IntelInfo._get_cpu_info(cpu_url)
-            except Exception:
-                log.exception("Loading Intel CPU-info from {} failed!".format(cpu_url))
-                raise
-            log.info("Intel CPU-family: {}, CPU: {}".format(family_name, cpu_data[0]))
-            all_cpus.append(cpu_data)
+            cpu_urls.append(cpu_url)
 
-        return all_cpus
+        return cpu_urls
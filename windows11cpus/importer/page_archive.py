@@ -0,0 +1,212 @@
+import os
+import mmap
+import hashlib
+import pickle
+import requests
+from typing import Iterator, Optional, Tuple
+import logging
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+log = logging.getLogger(__name__)
+
+
+class PageArchive:
+    # Pack file is a sequence of zstd-frames, one per unique page body.
+    # Index maps URLs to body hashes and body hashes to (offset, length, dictionary id) in the pack.
+    pack_filename = 'pages.pack'
+    index_filename = 'pages.idx'
+    dictionary_filename = 'pages.zdict'
+
+    COMPRESSION_LEVEL = 10
+    # Pages compressed before a dictionary exists are used as training samples
+    DICTIONARY_SAMPLES = 200
+    DICTIONARY_SIZE = 112640
+
+    # Archive currently recording fetched pages, see start_recording()
+    recorder = None
+
+    def __init__(self, archive_dir: str, writable: bool = False):
+        if not zstandard:
+            raise RuntimeError("Page archive requires zstandard-package!")
+
+        self.archive_dir = archive_dir
+        self.writable = writable
+        if writable:
+            os.makedirs(self.archive_dir, exist_ok=True)
+        self.index = self._load_index()
+        self.dictionary = self._load_dictionary()
+        self._samples = []
+        self._pack_out = open(self._path(PageArchive.pack_filename), 'ab') if writable else None
+        self._pack_file = None
+        self._pack_map = None
+        self._compressor = None
+        self._decompressors = {}
+
+    @staticmethod
+    def start_recording(archive_dir: str) -> "PageArchive":
+        PageArchive.stop_recording()
+        PageArchive.recorder = PageArchive(archive_dir, writable=True)
+        log.info("Archiving fetched pages into {}".format(archive_dir))
+
+        return PageArchive.recorder
+
+    @staticmethod
+    def stop_recording() -> None:
+        if PageArchive.recorder is not None:
+            PageArchive.recorder.close()
+            PageArchive.recorder = None
+
+    @staticmethod
+    def save_recording() -> None:
+        # Long-running recorders save periodically, not only when stopped
+        if PageArchive.recorder is not None:
+            PageArchive.recorder.save()
+
+    @staticmethod
+    def record(url: str, response: requests.Response) -> None:
+        # Error pages (403, 429, ...) must not replace a good archived body
+        if PageArchive.recorder is not None and response.ok:
+            PageArchive.recorder.add(url, response.content)
+
+    def add(self, url: str, content: bytes) -> None:
+        if not self.writable:
+            raise PermissionError("Page archive {} is opened read-only!".format(self.archive_dir))
+
+        content_hash = hashlib.sha256(content).hexdigest()
+        self.index['urls'][url] = content_hash
+        if content_hash in self.index['bodies']:
+            # Identical page body is already stored
+            return
+
+        if self.dictionary is not None:
+            dict_id = self.dictionary.dict_id()
+        else:
+            dict_id = 0
+            self._samples.append(content)
+        frame = self._get_compressor().compress(content)
+        offset = self._pack_out.seek(0, os.SEEK_END)
+        self._pack_out.write(frame)
+        self.index['bodies'][content_hash] = (offset, len(frame), dict_id)
+
+        if self.dictionary is None and len(self._samples) >= PageArchive.DICTIONARY_SAMPLES:
+            self.train_dictionary()
+
+    def train_dictionary(self) -> None:
+        # Bodies already stored stay compressed without dictionary
+        if self.dictionary is not None:
+            return
+        if not self._samples:
+            raise ValueError("No pages to train compression dictionary with!")
+        self.dictionary = zstandard.train_dictionary(PageArchive.DICTIONARY_SIZE, self._samples)
+        with open(self._path(PageArchive.dictionary_filename), 'wb') as f:
+            f.write(self.dictionary.as_bytes())
+        self._samples = []
+        self._compressor = None
+        log.debug("Trained page archive compression dictionary {}".format(self.dictionary.dict_id()))
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.index['urls']
+
+    def __len__(self) -> int:
+        return len(self.index['urls'])
+
+    def urls(self) -> list:
+        return list(self.index['urls'].keys())
+
+    def get(self, url: str) -> bytes:
+        content_hash = self.index['urls'].get(url)
+        if not content_hash:
+            raise KeyError("Page {} is not archived!".format(url))
+        offset, length, dict_id = self.index['bodies'][content_hash]
+
+        return self._get_decompressor(dict_id).decompress(self._get_map(offset + length)[offset:offset + length])
+
+    def items(self) -> Iterator[Tuple[str, bytes]]:
+        for url in self.urls():
+            yield url, self.get(url)
+
+    def save(self) -> None:
+        if not self._pack_out:
+            return
+        # Index must not point past the end of pack on disk
+        self._pack_out.flush()
+        os.fsync(self._pack_out.fileno())
+        self._save_index()
+
+    def close(self) -> None:
+        if self._pack_out:
+            self._pack_out.close()
+            self._pack_out = None
+            self._save_index()
+            log.info("Page archive {} has {} pages in {} unique bodies".format(
+                self.archive_dir, len(self.index['urls']), len(self.index['bodies'])))
+        if self._pack_map is not None:
+            self._pack_map.close()
+            self._pack_map = None
+        if self._pack_file:
+            self._pack_file.close()
+            self._pack_file = None
+
+    def _get_map(self, required_size: int) -> mmap.mmap:
+        # Pack may have grown since it was mapped
+        if self._pack_map is not None and len(self._pack_map) >= required_size:
+            return self._pack_map
+        if self._pack_out:
+            self._pack_out.flush()
+        if self._pack_map is not None:
+            self._pack_map.close()
+        if not self._pack_file:
+            self._pack_file = open(self._path(PageArchive.pack_filename), 'rb')
+        self._pack_map = mmap.mmap(self._pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return self._pack_map
+
+    def _get_compressor(self) -> "zstandard.ZstdCompressor":
+        if not self._compressor:
+            self._compressor = zstandard.ZstdCompressor(level=PageArchive.COMPRESSION_LEVEL,
+                                                        dict_data=self.dictionary)
+
+        return self._compressor
+
+    def _get_decompressor(self, dict_id: int) -> "zstandard.ZstdDecompressor":
+        if dict_id not in self._decompressors:
+            if not dict_id:
+                self._decompressors[dict_id] = zstandard.ZstdDecompressor()
+            elif self.dictionary is not None and self.dictionary.dict_id() == dict_id:
+                self._decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=self.dictionary)
+            else:
+                raise ValueError("Page archive {} doesn't have compression dictionary {}!".format(
+                    self.archive_dir, dict_id))
+
+        return self._decompressors[dict_id]
+
+    def _path(self, filename: str) -> str:
+        return "{}/{}".format(self.archive_dir, filename)
+
+    def _load_index(self) -> dict:
+        filename = self._path(PageArchive.index_filename)
+        if not os.path.exists(filename):
+            if not self.writable:
+                raise FileNotFoundError("No page archive in {}!".format(self.archive_dir))
+            return {'urls': {}, 'bodies': {}}
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+
+    def _save_index(self) -> None:
+        filename = self._path(PageArchive.index_filename)
+        tmp_filename = "{}.tmp".format(filename)
+        with open(tmp_filename, 'wb') as f:
+            # Pickle the 'data' dictionary using the highest protocol available.
+            pickle.dump(self.index, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, filename)
+
+    def _load_dictionary(self) -> Optional["zstandard.ZstdCompressionDict"]:
+        filename = self._path(PageArchive.dictionary_filename)
+        if not os.path.exists(filename):
+            return None
+        with open(filename, 'rb') as f:
+            return zstandard.ZstdCompressionDict(f.read())
@@ -0,0 +1,107 @@
+import os
+import re
+import hashlib
+import pickle
+from typing import Optional, Tuple
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class PageFingerprints:
+    # Bump this when any of the parsers changes its output.
+    # Records parsed by an older parser must not be re-used.
+    FORMAT_VERSION = 1
+
+    # Parts of a page changing on every load without changing the content
+    VOLATILE_PATTERNS = (
+        # CSRF-tokens and Drupal form tokens
+        (re.compile(rb'<input[^>]+name="(?:csrf[^"]*|_csrf|__RequestVerificationToken|form_build_id|form_token)"'
+                    rb'[^>]*>', re.IGNORECASE), b''),
+        (re.compile(rb'<meta[^>]+name="(?:csrf-token|csrf-param|request-id|ms\.date\.gen)"[^>]*>',
+                    re.IGNORECASE), b''),
+        (re.compile(rb'"(?:view_dom_id|form_build_id|csrfToken|requestId)"\s*:\s*"[^"]*"'), b''),
+        # Content Security Policy nonces
+        (re.compile(rb'\snonce="[^"]*"', re.IGNORECASE), b''),
+        # Timestamps, ISO 8601 and epoch-based cache busters
+        (re.compile(rb'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?'), b''),
+        (re.compile(rb'([?&](?:v|t|ts|_|timestamp)=)\d{9,}'), rb'\1'),
+    )
+
+    filename = 'page-fingerprints.dat'
+
+    # Class-level store: URL -> (fingerprint, parsed record)
+    _store = None
+    _store_filename = None
+    hits = 0
+    misses = 0
+
+    @staticmethod
+    def load(data_dir: str) -> None:
+        store_filename = "{}/{}".format(data_dir, PageFingerprints.filename)
+        if PageFingerprints._store is not None and PageFingerprints._store_filename == store_filename:
+            # Already loaded
+            return
+
+        store = {}
+        if os.path.exists(store_filename):
+            with open(store_filename, 'rb') as f:
+                saved = pickle.load(f)
+            if saved['version'] == PageFingerprints.FORMAT_VERSION:
+                store = saved['pages']
+            else:
+                log.info("Page fingerprints are from older parsers, not using them")
+        PageFingerprints._store = store
+        PageFingerprints._store_filename = store_filename
+        PageFingerprints.hits = 0
+        PageFingerprints.misses = 0
+
+    @staticmethod
+    def save() -> None:
+        if PageFingerprints._store is None:
+            return
+
+        tmp_filename = "{}.tmp".format(PageFingerprints._store_filename)
+        with open(tmp_filename, 'wb') as f:
+            saved = {
+                'version': PageFingerprints.FORMAT_VERSION,
+                'pages': PageFingerprints._store,
+            }
+            # Pickle the 'data' dictionary using the highest protocol available.
+            pickle.dump(saved, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, PageFingerprints._store_filename)
+        # Counts are since previous save, ie. a single scrape run or a daemon's state save interval
+        log.info("Page fingerprints: {} unchanged pages not parsed, {} pages parsed".format(
+            PageFingerprints.hits, PageFingerprints.misses))
+        PageFingerprints.hits = 0
+        PageFingerprints.misses = 0
+
+    @staticmethod
+    def fingerprint(content: bytes) -> str:
+        for pattern, replacement in PageFingerprints.VOLATILE_PATTERNS:
+            content = pattern.sub(replacement, content)
+
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def lookup(url: str, content: bytes) -> Tuple[Optional[str], Optional[object]]:
+        # Returns fingerprint of the content and the record parsed last time, if content is unchanged.
+        # Without a loaded store, nothing is fingerprinted.
+        if PageFingerprints._store is None:
+            return None, None
+
+        fingerprint = PageFingerprints.fingerprint(content)
+        stored = PageFingerprints._store.get(url)
+        if stored and stored[0] == fingerprint:
+            PageFingerprints.hits += 1
+            return fingerprint, stored[1]
+        PageFingerprints.misses += 1
+
+        return fingerprint, None
+
+    @staticmethod
+    def remember(url: str, fingerprint: Optional[str], record) -> None:
+        if PageFingerprints._store is None or not fingerprint:
+            return
+
+        PageFingerprints._store[url] = (fingerprint, record)
@@ -0,0 +1,367 @@
+import os
+import re
+import pickle
+from time import time, sleep
+from datetime import datetime
+from urllib import parse
+from typing import Optional, Tuple
+import logging
+from .intel import IntelInfo
+from .amd import AmdInfo
+from .scrape_cpu_lists import CpuScraper
+from .page_fingerprints import PageFingerprints
+from .page_archive import PageArchive
+
+log = logging.getLogger(__name__)
+
+
+class RefreshDaemon:
+    KIND_MICROSOFT_LIST = "microsoft-list"
+    KIND_INTEL_FAMILIES = "intel-families"
+    KIND_INTEL_FAMILY = "intel-family"
+    KIND_INTEL_CPU = "intel-cpu"
+    KIND_AMD_LIST = "amd-list"
+    KIND_AMD_CPU = "amd-cpu"
+    CPU_KINDS = (KIND_INTEL_CPU, KIND_AMD_CPU)
+
+    # Defaults, in seconds
+    MICROSOFT_INTERVAL = 6 * 3600
+    LISTING_INTERVAL = 24 * 3600
+    CPU_MIN_AGE = 24 * 3600
+    PUBLISH_INTERVAL = 3600
+    STATE_SAVE_INTERVAL = 300
+    MAX_IDLE_SLEEP = 60
+    REQUESTS_PER_HOUR = 360
+
+    # Priority of a CPU page is its staleness multiplied by weights.
+    # Listings are refreshed before any CPU page, never fetched CPUs before known ones.
+    LISTING_PRIORITY = 1e12
+    NEW_CPU_PRIORITY = 1e11
+    WIN11_WEIGHT = 2.0
+    RECENT_LAUNCH_WEIGHT = 1.0
+    RECENT_LAUNCH_YEARS = 2
+    # Failing host gets its request spacing doubled per consecutive failure, up to 2^6 times.
+    # Failing page waits the same way for its own retry.
+    MAX_BACKOFF_EXPONENT = 6
+
+    state_filename = 'refresh-state.dat'
+
+    def __init__(self, requests_per_hour: int = REQUESTS_PER_HOUR, host_requests_per_hour: dict = None,
+                 microsoft_interval: float = MICROSOFT_INTERVAL, listing_interval: float = LISTING_INTERVAL,
+                 cpu_min_age: float = CPU_MIN_AGE, publish_interval: float = PUBLISH_INTERVAL):
+        self.requests_per_hour = requests_per_hour
+        self.host_requests_per_hour = host_requests_per_hour or {}
+        self.intervals = {
+            RefreshDaemon.KIND_MICROSOFT_LIST: microsoft_interval,
+            RefreshDaemon.KIND_INTEL_FAMILIES: listing_interval,
+            RefreshDaemon.KIND_INTEL_FAMILY: listing_interval,
+            RefreshDaemon.KIND_AMD_LIST: listing_interval,
+            RefreshDaemon.KIND_INTEL_CPU: cpu_min_age,
+            RefreshDaemon.KIND_AMD_CPU: cpu_min_age,
+        }
+        self.publish_interval = publish_interval
+
+        # URL -> item
+        self.items = {}
+        # Host -> timestamp of next allowed request
+        self.host_next_request = {}
+        self.host_failures = {}
+        self.win11_models = set()
+        self.last_published = 0.0
+        self._dirty = False
+        self._last_state_save = 0.0
+        self._amd_sess = None
+
+        self._load_state()
+        self._add_root_items()
+
+    def run(self, max_requests: Optional[int] = None) -> None:
+        PageFingerprints.load(CpuScraper.data_dir)
+        request_count = 0
+        try:
+            while max_requests is None or request_count < max_requests:
+                now = time()
+                item, wake_at = self._next_item(now)
+                if item is None:
+                    sleep(min(max(wake_at - now, 1.0), RefreshDaemon.MAX_IDLE_SLEEP))
+                    continue
+                self._refresh(item, now)
+                request_count += 1
+
+                now = time()
+                if self._dirty and now - self.last_published >= self.publish_interval:
+                    self.publish()
+                if now - self._last_state_save >= RefreshDaemon.STATE_SAVE_INTERVAL:
+                    self.save_state()
+        finally:
+            self.save_state()
+
+    def publish(self) -> bool:
+        # Don't overwrite production data with a partial initial crawl
+        unfetched = [item for item in self.items.values() if item['last_fetched'] is None]
+        if unfetched:
+            log.debug("Not publishing, {} pages have never been fetched".format(len(unfetched)))
+            return False
+        missing = [item for item in self.items.values()
+                   if item['kind'] in RefreshDaemon.CPU_KINDS and item['record'] is None]
+        if missing:
+            log.debug("Not publishing, {} CPUs have no information".format(len(missing)))
+            return False
+        self._remove_orphans()
+
+        vendor_cpus = {
+            'Intel': self._records(RefreshDaemon.KIND_INTEL_CPU),
+            'AMD': self._records(RefreshDaemon.KIND_AMD_CPU),
+        }
+        for vendor, filename in (('Intel', CpuScraper.intel_filename), ('AMD', CpuScraper.amd_filename)):
+            with open("{}/{}".format(CpuScraper.data_dir, filename), 'wb') as f:
+                # Pickle the 'data' dictionary using the highest protocol available.
+                pickle.dump(vendor_cpus[vendor], f, pickle.HIGHEST_PROTOCOL)
+        CpuScraper._save_cpus(vendor_cpus, final=True)
+        self.last_published = time()
+        self._dirty = False
+        log.info("Published {} Intel and {} AMD CPUs".format(len(vendor_cpus['Intel']), len(vendor_cpus['AMD'])))
+
+        return True
+
+    def save_state(self) -> None:
+        # Page fingerprints and archive index are saved along, a killed daemon loses only the latest interval
+        PageFingerprints.save()
+        PageArchive.save_recording()
+        filename = "{}/{}".format(CpuScraper.data_dir, RefreshDaemon.state_filename)
+        state = {
+            'items': self.items,
+            'host_next_request': self.host_next_request,
+            'win11_models': self.win11_models,
+            'last_published': self.last_published,
+            'dirty': self._dirty,
+        }
+        with open("{}.tmp".format(filename), 'wb') as f:
+            # Pickle the 'data' dictionary using the highest protocol available.
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.replace("{}.tmp".format(filename), filename)
+        self._last_state_save = time()
+
+    def _load_state(self) -> None:
+        filename = "{}/{}".format(CpuScraper.data_dir, RefreshDaemon.state_filename)
+        if not os.path.exists(filename):
+            self._seed_from_dataset()
+            return
+
+        with open(filename, 'rb') as f:
+            state = pickle.load(f)
+        self.items = state['items']
+        self.host_next_request = state['host_next_request']
+        self.win11_models = state['win11_models']
+        self.last_published = state['last_published']
+        self._dirty = state['dirty']
+
+    def _seed_from_dataset(self) -> None:
+        # Start from previous one-shot scrape, if there is one. Saves a full crawl.
+        for kind, filename in ((RefreshDaemon.KIND_INTEL_CPU, CpuScraper.intel_filename),
+                               (RefreshDaemon.KIND_AMD_CPU, CpuScraper.amd_filename)):
+            filename = "{}/{}".format(CpuScraper.data_dir, filename)
+            if not os.path.exists(filename):
+                continue
+            fetched_at = os.path.getmtime(filename)
+            with open(filename, 'rb') as f:
+                cpus = pickle.load(f)
+            # AMD CPUs all come from a single listing. Intel families are not known yet.
+            parent = AmdInfo.PROCESSORS_URL if kind == RefreshDaemon.KIND_AMD_CPU else None
+            for cpu in cpus:
+                item = self._add_item(kind, cpu[4], parent)
+                item['last_fetched'] = fetched_at
+                item['record'] = cpu
+                item['launch_year'] = RefreshDaemon._launch_year(cpu[2])
+            log.info("Seeded {} {} items from {}".format(len(cpus), kind, filename))
+
+    def _add_root_items(self) -> None:
+        for url in CpuScraper.CPU_LISTS:
+            self._add_item(RefreshDaemon.KIND_MICROSOFT_LIST, url, None)
+        self._add_item(RefreshDaemon.KIND_INTEL_FAMILIES, IntelInfo.PROCESSORS_URL, None)
+        self._add_item(RefreshDaemon.KIND_AMD_LIST, AmdInfo.PROCESSORS_URL, None)
+
+    def _add_item(self, kind: str, url: str, parent: Optional[str]) -> dict:
+        if url in self.items:
+            item = self.items[url]
+            item['parent'] = parent
+            return item
+
+        item = {
+            'kind': kind,
+            'url': url,
+            'host': parse.urlparse(url).netloc,
+            'parent': parent,
+            'last_fetched': None,
+            'next_attempt': None,
+            'failures': 0,
+            'record': None,
+            'win11': False,
+            'launch_year': None,
+            'processor_id': None,
+        }
+        self.items[url] = item
+
+        return item
+
+    def _next_item(self, now: float) -> Tuple[Optional[dict], float]:
+        best_item = None
+        best_priority = None
+        wake_at = now + RefreshDaemon.MAX_IDLE_SLEEP
+        recent_launch_year = datetime.utcnow().year - RefreshDaemon.RECENT_LAUNCH_YEARS
+        for item in self.items.values():
+            if item['kind'] == RefreshDaemon.KIND_AMD_CPU and not item['processor_id']:
+                # Seeded item, waiting for AMD listing to tell its ID
+                continue
+            if item['last_fetched'] is None:
+                due_at = now
+            else:
+                due_at = item['last_fetched'] + self.intervals[item['kind']]
+            if item.get('next_attempt'):
+                # Failed, retry after back-off
+                due_at = max(due_at, item['next_attempt'])
+            host_at = self.host_next_request.get(item['host'], 0.0)
+            if due_at > now or host_at > now:
+                wake_at = min(wake_at, max(due_at, host_at))
+                continue
+
+            priority = self._priority(item, now, recent_launch_year)
+            if best_priority is None or priority > best_priority:
+                best_item = item
+                best_priority = priority
+
+        return best_item, wake_at
+
+    def _priority(self, item: dict, now: float, recent_launch_year: int) -> float:
+        if item['kind'] not in RefreshDaemon.CPU_KINDS:
+            staleness = now - (item['last_fetched'] or 0.0)
+            return RefreshDaemon.LISTING_PRIORITY + staleness
+        if item['last_fetched'] is None:
+            # Failing new page doesn't block the other new ones
+            return RefreshDaemon.NEW_CPU_PRIORITY - item['failures']
+
+        weight = 1.0
+        if item['win11']:
+            weight += RefreshDaemon.WIN11_WEIGHT
+        if item['launch_year'] and item['launch_year'] >= recent_launch_year:
+            weight += RefreshDaemon.RECENT_LAUNCH_WEIGHT
+
+        return (now - item['last_fetched']) * weight
+
+    def _refresh(self, item: dict, now: float) -> None:
+        host = item['host']
+        spacing = 3600.0 / self.host_requests_per_hour.get(host, self.requests_per_hour)
+        self.host_next_request[host] = now + spacing
+        kind = item['kind']
+        try:
+            if kind == RefreshDaemon.KIND_MICROSOFT_LIST:
+                item['record'] = CpuScraper.scrape_win11_list(item['url'])
+                self._update_win11_models()
+            elif kind == RefreshDaemon.KIND_INTEL_FAMILIES:
+                families = IntelInfo.list_families()
+                self._update_children(item, RefreshDaemon.KIND_INTEL_FAMILY,
+                                      {family_url: {} for family_name, family_url in families})
+            elif kind == RefreshDaemon.KIND_INTEL_FAMILY:
+                cpu_urls = IntelInfo.list_family_cpu_urls(item['url'])
+                self._update_children(item, RefreshDaemon.KIND_INTEL_CPU, {cpu_url: {} for cpu_url in cpu_urls})
+            elif kind == RefreshDaemon.KIND_INTEL_CPU:
+                self._update_record(item, IntelInfo._get_cpu_info(item['url']))
+            elif kind == RefreshDaemon.KIND_AMD_LIST:
+                processor_ids = AmdInfo.list_processor_ids(self._amd_session())
+                self._update_children(item, RefreshDaemon.KIND_AMD_CPU,
+                                      {AmdInfo.PROCESSOR_INFO_URL.format(processor_id): {'processor_id': processor_id}
+                                       for processor_id in processor_ids})
+            elif kind == RefreshDaemon.KIND_AMD_CPU:
+                self._update_record(item, AmdInfo._scrape_cpu(self._amd_session(), item['processor_id']))
+            else:
+                raise ValueError("Don't know refresh item kind {}!".format(kind))
+            item['last_fetched'] = now
+            item['next_attempt'] = None
+            item['failures'] = 0
+            self.host_failures[host] = 0
+        except Exception:
+            log.exception("Refreshing {} {} failed!".format(kind, item['url']))
+            item['failures'] += 1
+            self.host_failures[host] = self.host_failures.get(host, 0) + 1
+            backoff = 2 ** min(self.host_failures[host], RefreshDaemon.MAX_BACKOFF_EXPONENT)
+            self.host_next_request[host] = now + spacing * backoff
+            # Page stays stale, but is not retried before the back-off
+            item['next_attempt'] = now + spacing * 2 ** min(item['failures'], RefreshDaemon.MAX_BACKOFF_EXPONENT)
+
+    def _update_record(self, item: dict, record: tuple) -> None:
+        if record != item['record']:
+            log.info("{} changed: {}".format(item['kind'], record[0]))
+            item['record'] = record
+            item['launch_year'] = RefreshDaemon._launch_year(record[2])
+            item['win11'] = self._is_win11_listed(record[0])
+            self._dirty = True
+
+    def _update_children(self, item: dict, child_kind: str, children: dict) -> None:
+        # Empty listing is a broken page, not all children gone. Fail the refresh to retry later.
+        if not children:
+            raise ValueError("Listing {} has no {} items!".format(item['url'], child_kind))
+        for child_url, child_fields in children.items():
+            if child_url not in self.items:
+                log.info("New {}: {}".format(child_kind, child_url))
+                self._dirty = True
+            child = self._add_item(child_kind, child_url, item['url'])
+            child.update(child_fields)
+
+        gone_urls = [url for url, child in self.items.items()
+                     if child['parent'] == item['url'] and url not in children]
+        for url in gone_urls:
+            self._remove_item(url)
+
+    def _remove_orphans(self) -> None:
+        # Seeded Intel CPUs have no family until a family listing has them.
+        # Once all listings are fetched, the ones no family lists are gone from ARK.
+        orphan_urls = [url for url, item in self.items.items()
+                       if item['kind'] == RefreshDaemon.KIND_INTEL_CPU and item['parent'] is None]
+        for url in orphan_urls:
+            self._remove_item(url)
+
+    def _remove_item(self, url: str) -> None:
+        # Children of removed listing go too
+        log.info("Removed {}: {}".format(self.items[url]['kind'], url))
+        del self.items[url]
+        self._dirty = True
+        for child_url in [child_url for child_url, child in self.items.items() if child['parent'] == url]:
+            self._remove_item(child_url)
+
+    def _update_win11_models(self) -> None:
+        # Expected tuple content is: Manufacturer, Brand, Model
+        self.win11_models = set()
+        for item in self.items.values():
+            if item['kind'] == RefreshDaemon.KIND_MICROSOFT_LIST and item['record']:
+                self.win11_models.update(cpu[2] for cpu in item['record'])
+        for item in self.items.values():
+            if item['kind'] in RefreshDaemon.CPU_KINDS and item['record']:
+                item['win11'] = self._is_win11_listed(item['record'][0])
+
+    def _is_win11_listed(self, cpu_title: str) -> bool:
+        # Same as the primary model match done when enriching
+        return any(model in cpu_title for model in self.win11_models)
+
+    def _records(self, kind: str) -> list:
+        return [item['record'] for item in self.items.values() if item['kind'] == kind and item['record']]
+
+    def _amd_session(self):
+        if not self._amd_sess:
+            self._amd_sess = AmdInfo.session()
+
+        return self._amd_sess
+
+    @staticmethod
+    def _launch_year(launched_at: Optional[str]) -> Optional[int]:
+        # Only the year is needed for priority, see CLI for full launch quarter parsing
+        if not launched_at:
+            return None
+        launched_at = launched_at.split(',', 1)[0].strip()
+        match = re.search(r'((?:19|20)\d{2})$', launched_at)  # 11/5/2020, September 2018, Q12021
+        if match:
+            return int(match.group(1))
+        match = re.search(r'(\d{2})$', launched_at)  # Q2'17, 04/16, 2Q18
+        if match:
+            return 2000 + int(match.group(1))
+
+        return None
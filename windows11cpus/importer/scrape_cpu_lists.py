@@ -5,6 +5,9 @@ import pickle
 import logging
 from .intel import IntelInfo
 from .amd import AmdInfo
+from .page_fingerprints import PageFingerprints
+from .page_archive import PageArchive
+from ..snapshot import DatasetSnapshots
 
 log = logging.getLogger(__name__)
 
@@ -20,17 +23,49 @@ class CpuScraper:
     production_filename = 'all-vendors-cpus.dat'
     intel_filename = 'intel-cpus.dat'
     amd_filename = 'amd-cpus.dat'
+    snapshot_dirname = 'snapshots'
+    archive_dirname = 'page-archive'
 
     @staticmethod
     def scrape_win11_cpus() -> list:
         cpu_lists = []
-        for url in CpuScraper.CPU_LISTS:
-            r = requests.get(url)
-            cpu_list = CpuScraper._html_parser(r.content)
-            cpu_lists.append(cpu_list)
+        PageFingerprints.load(CpuScraper.data_dir)
+        try:
+            for url in CpuScraper.CPU_LISTS:
+                cpu_list = CpuScraper.scrape_win11_list(url)
+                cpu_lists.append(cpu_list)
+        finally:
+            PageFingerprints.save()
 
         return cpu_lists
 
+    @staticmethod
+    def scrape_win11_list(url: str) -> list:
+        r = requests.get(url)
+        PageArchive.record(url, r)
+        r.raise_for_status()
+        fingerprint, cpu_list = PageFingerprints.lookup(url, r.content)
+        if not cpu_list:
+            cpu_list = CpuScraper._html_parser(r.content)
+            PageFingerprints.remember(url, fingerprint, cpu_list)
+
+        return cpu_list
+
+    @staticmethod
+    def parse_archive(archive: PageArchive) -> tuple:
+        # Offline: re-run all parsers over archived pages, no network access needed
+        cpu_lists = []
+        for url in CpuScraper.CPU_LISTS:
+            if url not in archive:
+                raise FileNotFoundError("Page {} is not archived!".format(url))
+            cpu_lists.append(CpuScraper._html_parser(archive.get(url)))
+        vendor_cpus = {
+            'Intel': IntelInfo.parse_archive(archive),
+            'AMD': AmdInfo.parse_archive(archive),
+        }
+
+        return cpu_lists, vendor_cpus
+
     @staticmethod
     def _html_parser(content: str) -> list:
         parsed_html = BeautifulSoup(content, "html.parser")
@@ -59,7 +94,19 @@ class CpuScraper:
     @staticmethod
     def scrape_vendors(force: bool = False) -> dict:
         cpus = {}
+        PageFingerprints.load(CpuScraper.data_dir)
+        try:
+            CpuScraper._scrape_vendors(cpus, force)
+        finally:
+            PageFingerprints.save()
+
+        # All done!
+        CpuScraper._save_cpus(cpus, final=True)
+
+        return cpus
 
+    @staticmethod
+    def _scrape_vendors(cpus: dict, force: bool) -> None:
         # Intel
         filename = "{}/{}".format(CpuScraper.data_dir, CpuScraper.intel_filename)
         if not force and os.path.exists(filename):
@@ -85,11 +132,6 @@ class CpuScraper:
                 pickle.dump(amd_cpus, f, pickle.HIGHEST_PROTOCOL)
         cpus['AMD'] = amd_cpus
 
-        # All done!
-        CpuScraper._save_cpus(cpus, final=True)
-
-        return cpus
-
     @staticmethod
     def _save_cpus(vendor_cpus: dict, final: bool = False) -> None:
         wip_filename = 'all-vendors-cpus-work-in-progress.dat'
@@ -103,3 +145,9 @@ class CpuScraper:
 
         if final and os.path.exists(wip_filename):
             os.unlink(wip_filename)
+
+        if final:
+            # Keep history of the production data as deltas
+            snapshots = DatasetSnapshots("{}/{}".format(CpuScraper.data_dir, CpuScraper.snapshot_dirname))
+            version, report = snapshots.commit(vendor_cpus)
+            log.info("Changes in dataset version {}:\n{}".format(version, report))
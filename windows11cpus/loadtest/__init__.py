@@ -0,0 +1,4 @@
+from .fixture_server import FixtureServer, FixturePages, ThrottlingProfile
+from .crawler_load_test import CrawlerLoadTest, CrawlerConfiguration
+
+__all__ = ['FixtureServer', 'FixturePages', 'ThrottlingProfile', 'CrawlerLoadTest', 'CrawlerConfiguration']
@@ -0,0 +1,225 @@
+import math
+import threading
+import requests
+from time import time
+from typing import Optional
+import logging
+from ..importer import IntelInfo, AmdInfo, CpuScraper
+from .fixture_server import FixtureServer, ThrottlingProfile
+
+log = logging.getLogger(__name__)
+
+
+class CrawlerConfiguration:
+
+    def __init__(self, name: str, workers: int = 1, request_delay: Optional[float] = None,
+                 load_timeout: Optional[float] = None):
+        # Number of crawlers running in parallel, ie. concurrency against the same host.
+        # Delay and timeout override crawler's REQUEST_DELAY and LOAD_TIMEOUT, None keeps crawler's own.
+        self.name = name
+        self.workers = workers
+        self.request_delay = request_delay
+        self.load_timeout = load_timeout
+
+
+class CrawlerLoadTest:
+    CRAWLER_INTEL = "intel"
+    CRAWLER_AMD = "amd"
+    CRAWLERS = {
+        CRAWLER_INTEL: IntelInfo,
+        CRAWLER_AMD: AmdInfo,
+    }
+
+    # Responses telling the crawler is pushing too hard
+    BLOCK_EVENTS = (FixtureServer.EVENT_RATE_LIMITED, FixtureServer.EVENT_BLOCKED, FixtureServer.EVENT_RESET)
+
+    def __init__(self, pages: dict, profiles: dict = None, default_profile: ThrottlingProfile = None,
+                 seed: Optional[int] = None):
+        self.pages = pages
+        self.profiles = profiles
+        self.default_profile = default_profile
+        self.seed = seed
+
+    def run_all(self, crawler: str, configurations: list) -> list:
+        return [self.run(crawler, configuration) for configuration in configurations]
+
+    def run(self, crawler: str, configuration: CrawlerConfiguration) -> dict:
+        if crawler not in CrawlerLoadTest.CRAWLERS:
+            raise ValueError("Don't know crawler {}!".format(crawler))
+        crawler_class = CrawlerLoadTest.CRAWLERS[crawler]
+
+        # Fresh server for every run, no rate limit or block state is carried over
+        server = FixtureServer(self.pages, self.profiles, self.default_profile, self.seed)
+        server.start()
+        # Requests as seen by the crawler, including time-outs and failed connections
+        client_events = []
+        saved_attributes = CrawlerLoadTest._patch(server, crawler_class, configuration, client_events)
+        crawler_settings = (crawler_class.REQUEST_DELAY, crawler_class.LOAD_TIMEOUT)
+        cpu_counts = []
+        errors = []
+
+        def _worker() -> None:
+            try:
+                cpus = crawler_class.scrape()
+                with lock:
+                    cpu_counts.append(len(cpus))
+            except Exception as exc:
+                with lock:
+                    errors.append("{}: {}".format(type(exc).__name__, exc))
+
+        lock = threading.Lock()
+        log.info("Load testing {} crawler with configuration {}".format(crawler, configuration.name))
+        started_at = time()
+        try:
+            workers = [threading.Thread(target=_worker, name="crawler-{}".format(worker_idx))
+                       for worker_idx in range(configuration.workers)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            duration = time() - started_at
+            CrawlerLoadTest._restore(saved_attributes)
+            server.stop()
+
+        return CrawlerLoadTest._report(crawler, configuration, crawler_settings, duration, client_events,
+                                       server.events, cpu_counts, errors)
+
+    @staticmethod
+    def _patch(server: FixtureServer, crawler_class: type, configuration: CrawlerConfiguration,
+               client_events: list) -> list:
+        # Returns list of (object, attribute name, original value)
+        original_request = requests.Session.request
+
+        def _timed_request(session: requests.Session, method: str, url: str, *args, **kwargs) -> requests.Response:
+            # Both crawlers end up here, requests.get() uses a throw-away session
+            started = time()
+            try:
+                response = original_request(session, method, url, *args, **kwargs)
+            except requests.RequestException as exc:
+                client_events.append({
+                    'started': started,
+                    'duration': time() - started,
+                    'url': url,
+                    'status': None,
+                    'error': type(exc).__name__,
+                    'timeout': isinstance(exc, requests.Timeout),
+                })
+                raise
+            client_events.append({
+                'started': started,
+                'duration': time() - started,
+                'url': url,
+                'status': response.status_code,
+                'error': None,
+                'timeout': False,
+            })
+
+            return response
+
+        patches = [
+            (requests.Session, 'request', _timed_request),
+            (IntelInfo, 'PROCESSORS_URL', server.local_url(IntelInfo.PROCESSORS_URL)),
+            (IntelInfo, 'SEARCH_URL', server.local_url(IntelInfo.SEARCH_URL)),
+            (AmdInfo, 'PROCESSORS_URL', server.local_url(AmdInfo.PROCESSORS_URL)),
+            (AmdInfo, 'PROCESSOR_INFO_URL', server.local_url(AmdInfo.PROCESSOR_INFO_URL)),
+            (CpuScraper, 'CPU_LISTS', tuple(server.local_url(url) for url in CpuScraper.CPU_LISTS)),
+        ]
+        if configuration.request_delay is not None:
+            patches.append((crawler_class, 'REQUEST_DELAY', configuration.request_delay))
+        if configuration.load_timeout is not None:
+            patches.append((crawler_class, 'LOAD_TIMEOUT', configuration.load_timeout))
+
+        saved_attributes = []
+        for obj, attribute, value in patches:
+            saved_attributes.append((obj, attribute, getattr(obj, attribute)))
+            setattr(obj, attribute, value)
+
+        return saved_attributes
+
+    @staticmethod
+    def _restore(saved_attributes: list) -> None:
+        for obj, attribute, value in reversed(saved_attributes):
+            setattr(obj, attribute, value)
+
+    @staticmethod
+    def _report(crawler: str, configuration: CrawlerConfiguration, crawler_settings: tuple, duration: float,
+                client_events: list, events: list, cpu_counts: list, errors: list) -> dict:
+        # Latency is measured on the client: server's view misses connect, transfer and time-outs
+        latencies = sorted(event['duration'] for event in client_events)
+        event_counts = {}
+        for event in events:
+            event_counts[event['event']] = event_counts.get(event['event'], 0) + 1
+        # Seconds from first request to first block event
+        first_block_at = None
+        block_starts = [event['started'] for event in events if event['event'] in CrawlerLoadTest.BLOCK_EVENTS]
+        if block_starts:
+            first_block_at = min(block_starts) - min(event['started'] for event in events)
+
+        report = {
+            'crawler': crawler,
+            'configuration': configuration.name,
+            'workers': configuration.workers,
+            'request_delay': crawler_settings[0],
+            'load_timeout': crawler_settings[1],
+            'duration': duration,
+            'requests': len(client_events),
+            'throughput': len(client_events) / duration if duration > 0 else 0.0,
+            'client_errors': sum(1 for event in client_events if event['error']),
+            'timeouts': sum(1 for event in client_events if event['timeout']),
+            'cpus': sum(cpu_counts),
+            'completed_workers': len(cpu_counts),
+            'failed_workers': len(errors),
+            'errors': errors,
+            'latency_p50': CrawlerLoadTest._percentile(latencies, 50),
+            'latency_p95': CrawlerLoadTest._percentile(latencies, 95),
+            'latency_p99': CrawlerLoadTest._percentile(latencies, 99),
+            'latency_max': latencies[-1] if latencies else None,
+            'events': event_counts,
+            'block_events': sum(event_counts.get(event, 0) for event in CrawlerLoadTest.BLOCK_EVENTS),
+            'first_block_after': first_block_at,
+        }
+
+        return report
+
+    @staticmethod
+    def _percentile(sorted_values: list, percentile: float) -> Optional[float]:
+        # Nearest-rank
+        if not sorted_values:
+            return None
+        rank = max(1, math.ceil(percentile / 100.0 * len(sorted_values)))
+
+        return sorted_values[rank - 1]
+
+    @staticmethod
+    def format_reports(reports: list) -> str:
+        def _seconds(value: Optional[float]) -> str:
+            return "-" if value is None else "{:.3f}".format(value)
+
+        header = ("Configuration", "Workers", "Delay", "Timeout", "Requests", "Req/s", "p50", "p95", "p99",
+                  "Timeouts", "Blocks", "First block", "CPUs", "Failed")
+        rows = [header]
+        for report in reports:
+            rows.append((
+                report['configuration'],
+                str(report['workers']),
+                _seconds(report['request_delay']),
+                _seconds(report['load_timeout']),
+                str(report['requests']),
+                "{:.2f}".format(report['throughput']),
+                _seconds(report['latency_p50']),
+                _seconds(report['latency_p95']),
+                _seconds(report['latency_p99']),
+                str(report['timeouts']),
+                str(report['block_events']),
+                _seconds(report['first_block_after']),
+                str(report['cpus']),
+                str(report['failed_workers']),
+            ))
+        widths = [max(len(row[column_idx]) for row in rows) for column_idx in range(len(header))]
+        lines = ["  ".join(cell.ljust(widths[column_idx]) for column_idx, cell in enumerate(row)) for row in rows]
+        for report in reports:
+            for error in report['errors']:
+                lines.append("{}: {}".format(report['configuration'], error))
+
+        return "\n".join(lines)
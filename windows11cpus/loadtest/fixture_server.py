@@ -0,0 +1,302 @@
+import math
+import socket
+import struct
+import random
+import threading
+from collections import deque
+from time import time, sleep
+from urllib import parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional
+import logging
+from ..importer import IntelInfo, AmdInfo, CpuScraper, PageArchive
+
+log = logging.getLogger(__name__)
+
+
+class ThrottlingProfile:
+    LATENCY_CONSTANT = "constant"
+    LATENCY_UNIFORM = "uniform"
+    LATENCY_EXPONENTIAL = "exponential"
+    LATENCY_LOGNORMAL = "lognormal"
+    LATENCY_DISTRIBUTIONS = (LATENCY_CONSTANT, LATENCY_UNIFORM, LATENCY_EXPONENTIAL, LATENCY_LOGNORMAL)
+
+    def __init__(self, latency_distribution: str = LATENCY_LOGNORMAL, latency_mean: float = 0.05,
+                 latency_sigma: float = 0.5,
+                 rate_limit_requests: Optional[int] = None, rate_limit_window: float = 60.0,
+                 block_after_requests: Optional[int] = None, block_window: float = 60.0,
+                 block_duration: float = 600.0,
+                 reset_probability: float = 0.0,
+                 slow_body_probability: float = 0.0, slow_body_bytes_per_second: int = 4096):
+        # Latency before response headers. Sigma is used by lognormal only.
+        if latency_distribution not in ThrottlingProfile.LATENCY_DISTRIBUTIONS:
+            raise ValueError("Don't know latency distribution {}!".format(latency_distribution))
+        self.latency_distribution = latency_distribution
+        self.latency_mean = latency_mean
+        self.latency_sigma = latency_sigma
+        # More than rate_limit_requests in rate_limit_window seconds gets 429 Too Many Requests
+        self.rate_limit_requests = rate_limit_requests
+        self.rate_limit_window = rate_limit_window
+        # More than block_after_requests in block_window seconds gets client blocked with 403 Forbidden
+        # for block_duration seconds. This is what AMD's Application Gateway does.
+        self.block_after_requests = block_after_requests
+        self.block_window = block_window
+        self.block_duration = block_duration
+        self.reset_probability = reset_probability
+        self.slow_body_probability = slow_body_probability
+        self.slow_body_bytes_per_second = slow_body_bytes_per_second
+
+    def latency(self, rnd: random.Random) -> float:
+        if self.latency_distribution == ThrottlingProfile.LATENCY_CONSTANT:
+            return self.latency_mean
+        if self.latency_distribution == ThrottlingProfile.LATENCY_UNIFORM:
+            return rnd.uniform(0, 2 * self.latency_mean)
+        if self.latency_distribution == ThrottlingProfile.LATENCY_EXPONENTIAL:
+            return rnd.expovariate(1.0 / self.latency_mean) if self.latency_mean > 0 else 0.0
+
+        # Lognormal with given mean: mu = ln(mean) - sigma^2 / 2
+        if self.latency_mean <= 0:
+            return 0.0
+        mu = math.log(self.latency_mean) - self.latency_sigma ** 2 / 2
+
+        return rnd.lognormvariate(mu, self.latency_sigma)
+
+
+class FixtureServer:
+    EVENT_OK = "ok"
+    EVENT_NOT_FOUND = "not-found"
+    EVENT_RATE_LIMITED = "rate-limited"
+    EVENT_BLOCKED = "blocked"
+    EVENT_RESET = "reset"
+    EVENT_SLOW_BODY = "slow-body"
+
+    SLOW_BODY_CHUNK_SIZE = 512
+
+    def __init__(self, pages: dict, profiles: dict = None, default_profile: ThrottlingProfile = None,
+                 seed: Optional[int] = None):
+        # Pages: URL path -> body
+        # Profiles: URL path prefix -> ThrottlingProfile, longest matching prefix wins
+        self.pages = pages
+        self.profiles = profiles or {}
+        self.default_profile = default_profile or ThrottlingProfile(latency_mean=0.0)
+        self.events = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        # (profile id, client) -> deque of request timestamps
+        self._request_times = {}
+        # (profile id, client) -> blocked until timestamp
+        self._blocked_until = {}
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+
+        return "http://{}:{}".format(host, port)
+
+    def start(self) -> None:
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), _FixtureRequestHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.fixture_server = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fixture-server", daemon=True)
+        self._thread.start()
+        log.debug("Fixture server listening at {}".format(self.base_url))
+
+    def stop(self) -> None:
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd = None
+
+    def local_url(self, url: str) -> str:
+        # Point a real-world URL to this server
+        url_parts = parse.urlparse(url)
+        base_url_parts = parse.urlparse(self.base_url)
+
+        return parse.urlunparse(url_parts._replace(scheme=base_url_parts.scheme, netloc=base_url_parts.netloc))
+
+    def profile_for(self, path: str) -> ThrottlingProfile:
+        matching_prefixes = [prefix for prefix in self.profiles if path.startswith(prefix)]
+        if not matching_prefixes:
+            return self.default_profile
+
+        return self.profiles[max(matching_prefixes, key=len)]
+
+    def _decide(self, path: str, client: str) -> tuple:
+        # Returns: event, latency, profile
+        profile = self.profile_for(path)
+        key = (id(profile), client)
+        with self._lock:
+            now = time()
+            latency = profile.latency(self._random)
+            if self._blocked_until.get(key, 0.0) > now:
+                return FixtureServer.EVENT_BLOCKED, latency, profile
+
+            request_times = self._request_times.setdefault(key, deque())
+            request_times.append(now)
+            window = max(profile.rate_limit_window if profile.rate_limit_requests else 0.0,
+                         profile.block_window if profile.block_after_requests else 0.0)
+            while request_times and request_times[0] < now - window:
+                request_times.popleft()
+
+            if profile.block_after_requests:
+                recent = sum(1 for request_time in request_times if request_time >= now - profile.block_window)
+                if recent > profile.block_after_requests:
+                    self._blocked_until[key] = now + profile.block_duration
+                    log.debug("Fixture server blocking {} for {} seconds".format(client, profile.block_duration))
+                    return FixtureServer.EVENT_BLOCKED, latency, profile
+            if profile.rate_limit_requests:
+                recent = sum(1 for request_time in request_times if request_time >= now - profile.rate_limit_window)
+                if recent > profile.rate_limit_requests:
+                    return FixtureServer.EVENT_RATE_LIMITED, latency, profile
+            if self._random.random() < profile.reset_probability:
+                return FixtureServer.EVENT_RESET, latency, profile
+            if path not in self.pages:
+                return FixtureServer.EVENT_NOT_FOUND, latency, profile
+            if self._random.random() < profile.slow_body_probability:
+                return FixtureServer.EVENT_SLOW_BODY, latency, profile
+
+        return FixtureServer.EVENT_OK, latency, profile
+
+    def _record(self, started_at: float, path: str, event: str, status: Optional[int]) -> None:
+        with self._lock:
+            self.events.append({
+                'started': started_at,
+                'duration': time() - started_at,
+                'path': path,
+                'event': event,
+                'status': status,
+            })
+
+
+class _FixtureRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go in separate writes. With Nagle's algorithm a keep-alive client
+    # would wait for the delayed ACK, adding ~40 ms to every back-to-back request.
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        started_at = time()
+        server = self.server.fixture_server
+        path = parse.urlparse(self.path).path
+        event, latency, profile = server._decide(path, self.client_address[0])
+        sleep(latency)
+
+        if event == FixtureServer.EVENT_RESET:
+            # Abort the TCP-connection: RST instead of FIN
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            self.connection.close()
+            self.close_connection = True
+            server._record(started_at, path, event, None)
+            return
+
+        if event == FixtureServer.EVENT_BLOCKED:
+            status, body = 403, b"<html><body><h1>403 Forbidden</h1></body></html>"
+        elif event == FixtureServer.EVENT_RATE_LIMITED:
+            status, body = 429, b"<html><body><h1>429 Too Many Requests</h1></body></html>"
+        elif event == FixtureServer.EVENT_NOT_FOUND:
+            status, body = 404, b"<html><body><h1>404 Not Found</h1></body></html>"
+        else:
+            status, body = 200, server.pages[path]
+
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            if status == 429:
+                self.send_header("Retry-After", str(int(profile.rate_limit_window)))
+            self.end_headers()
+            if event == FixtureServer.EVENT_SLOW_BODY:
+                chunk_delay = FixtureServer.SLOW_BODY_CHUNK_SIZE / profile.slow_body_bytes_per_second
+                for offset in range(0, len(body), FixtureServer.SLOW_BODY_CHUNK_SIZE):
+                    self.wfile.write(body[offset:offset + FixtureServer.SLOW_BODY_CHUNK_SIZE])
+                    self.wfile.flush()
+                    sleep(chunk_delay)
+            else:
+                self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client gave up, ie. timed out
+            self.close_connection = True
+        server._record(started_at, path, event, status)
+
+    def log_message(self, format: str, *args) -> None:
+        # Request log is in FixtureServer.events
+        pass
+
+
+class FixturePages:
+    # Synthetic pages having just enough structure for IntelInfo, AmdInfo and CpuScraper parsers
+
+    @staticmethod
+    def generate(intel_families: int = 5, cpus_per_family: int = 10, amd_cpus: int = 50) -> dict:
+        pages = {}
+
+        # Intel ARK
+        intel_families_path = parse.urlparse(IntelInfo.PROCESSORS_URL).path
+        family_links = []
+        cpu_id = 100000
+        for family_idx in range(intel_families):
+            family_path = "/content/www/us/en/ark/products/series/{}/fixture-family-{}.html".format(
+                family_idx + 1, family_idx + 1)
+            family_links.append('<a href="{}">Intel® Fixture Processor Family {}</a>'.format(
+                family_path, family_idx + 1))
+            cpu_rows = []
+            for _ in range(cpus_per_family):
+                cpu_id += 1
+                cpu_path = "/content/www/us/en/ark/products/{}/intel-fixture-{}-processor.html".format(cpu_id, cpu_id)
+                cpu_rows.append('<tr><td data-component="arkproductlink"><a href="{}">Intel® Fixture {}</a>'
+                                '</td></tr>'.format(cpu_path, cpu_id))
+                pages[cpu_path] = FixturePages._html(
+                    '<h1 class="h1">Intel® Fixture™ {} Processor </h1>'
+                    '<span class="value" data-key="ProcessorNumber">{}</span>'
+                    '<span class="value" data-key="BornOnDate">Q{}\'{}</span>'
+                    '<span class="value" data-key="ProductGroup"><a href="{}">Intel® Fixture Processor Family {}'
+                    '</a></span>'.format(cpu_id, cpu_id, 1 + cpu_id % 4, 10 + cpu_id % 12, family_path,
+                                         family_idx + 1))
+            pages[family_path] = FixturePages._html(
+                '<table id="product-table"><tbody>{}</tbody></table>'.format(''.join(cpu_rows)))
+        pages[intel_families_path] = FixturePages._html(
+            '<div class="products processors" data-parent-panel-key="PanelLabel122139">{}</div>'.format(
+                ''.join(family_links)))
+
+        # AMD
+        amd_rows = []
+        for amd_idx in range(amd_cpus):
+            processor_id = str(10000 + amd_idx)
+            amd_rows.append('<tr><td headers="view-name-table-column" class="views-field entity-{}">'
+                            'AMD Fixture™ {}</td></tr>'.format(processor_id, processor_id))
+            pages[parse.urlparse(AmdInfo.PROCESSOR_INFO_URL.format(processor_id)).path] = FixturePages._html(
+                '<div id="block-amd-page-title"><h2>AMD Fixture™ {}</h2></div>'
+                '<div id="product-specs"><div class="fieldset-wrapper">'
+                '<div class="field--name-field-launch-date"><div class="field__item">{}/20{}</div></div>'
+                '<div class="field--name-product-type"><div class="field__item">Desktop Processors</div></div>'
+                '</div></div>'.format(processor_id, 1 + amd_idx % 12, 17 + amd_idx % 5))
+        pages[parse.urlparse(AmdInfo.PROCESSORS_URL).path] = FixturePages._html(
+            '<table id="spec-table"><tbody>{}</tbody></table>'.format(''.join(amd_rows)))
+
+        # Microsoft
+        for url in CpuScraper.CPU_LISTS:
+            pages[parse.urlparse(url).path] = FixturePages._html(
+                '<main id="main"><table><tbody>'
+                '<tr><td>Intel®</td><td>Fixture</td><td>100001</td></tr>'
+                '<tr><td>AMD</td><td>Fixture</td><td>10000</td></tr>'
+                '</tbody></table></main>')
+
+        return pages
+
+    @staticmethod
+    def from_archive(archive: PageArchive) -> dict:
+        # Real pages from a previous crawl. Hosts don't matter, their paths don't overlap.
+        pages = {}
+        for url, content in archive.items():
+            pages[parse.urlparse(url).path] = content
+
+        return pages
+
+    @staticmethod
+    def _html(body: str) -> bytes:
+        # Crawlers parse bytes, without the charset BeautifulSoup would have to guess the encoding
+        return ('<!DOCTYPE html><html><head><meta charset="utf-8"><title>Fixture</title></head>'
+                '<body>{}</body></html>'.format(body).encode('utf-8'))
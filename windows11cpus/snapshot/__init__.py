@@ -0,0 +1,3 @@
+from .dataset_snapshots import DatasetSnapshots
+
+__all__ = ['DatasetSnapshots']
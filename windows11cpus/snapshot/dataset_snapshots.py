@@ -0,0 +1,188 @@
+import os
+import pickle
+from datetime import datetime
+from typing import Optional, Tuple
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class DatasetSnapshots:
+    # Vendor CPU tuple columns, as scraped by IntelInfo and AmdInfo
+    CPU_FIELDS = ('Processor Title', 'Processor Number', 'Launch', 'Family', 'URL to information')
+    URL_IDX = 4
+
+    index_filename = 'index.dat'
+    head_filename = 'head.dat'
+    delta_filename = 'delta-{:05d}.dat'
+    report_filename = 'report-{:05d}.txt'
+
+    def __init__(self, snapshot_dir: str):
+        self.snapshot_dir = snapshot_dir
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        self.index = self._load(DatasetSnapshots.index_filename, [])
+
+    @property
+    def latest_version(self) -> int:
+        if not self.index:
+            return 0
+
+        return self.index[-1]['version']
+
+    def commit(self, vendor_cpus: dict) -> Tuple[int, str]:
+        # Only the delta against previous run is stored.
+        # Head is a single full copy of the latest version, overwritten on every run.
+        # Index is written last, a version exists only when index has it.
+        previous_cpus = self._load_head()
+        version = self.latest_version + 1
+        delta = DatasetSnapshots.diff(previous_cpus, vendor_cpus)
+        delta['version'] = version
+        delta['timestamp'] = datetime.utcnow()
+
+        report = DatasetSnapshots.change_report(delta, previous_cpus)
+        self._save(DatasetSnapshots.delta_filename.format(version), delta)
+        with open(self._path(DatasetSnapshots.report_filename.format(version)), 'w', encoding='utf-8') as f:
+            f.write(report)
+        self._save(DatasetSnapshots.head_filename, {'version': version, 'cpus': vendor_cpus})
+
+        summary = {}
+        for vendor, vendor_delta in delta['vendors'].items():
+            summary[vendor] = (len(vendor_delta['added']), len(vendor_delta['removed']), len(vendor_delta['changed']))
+        self.index.append({
+            'version': version,
+            'timestamp': delta['timestamp'],
+            'summary': summary,
+        })
+        self._save(DatasetSnapshots.index_filename, self.index)
+        log.info("Saved dataset snapshot version {}".format(version))
+
+        return version, report
+
+    def _load_head(self) -> dict:
+        head = self._load(DatasetSnapshots.head_filename, None)
+        if not self.latest_version:
+            return {}
+        if head and head.get('version') == self.latest_version:
+            return head['cpus']
+
+        # Previous commit didn't finish. Don't trust head, diff against indexed history.
+        log.warning("Dataset snapshot head doesn't match version {}, rebuilding it from deltas".format(
+            self.latest_version))
+
+        return self.rebuild(self.latest_version)
+
+    def rebuild(self, version: Optional[int] = None) -> dict:
+        if version is None:
+            version = self.latest_version
+        if not 0 < version <= self.latest_version:
+            raise ValueError("No snapshot version {}!".format(version))
+
+        vendor_cpus = {}
+        for index_entry in self.index:
+            if index_entry['version'] > version:
+                break
+            delta = self._load(DatasetSnapshots.delta_filename.format(index_entry['version']), None)
+            if delta is None:
+                raise FileNotFoundError("Delta for snapshot version {} is missing!".format(index_entry['version']))
+            vendor_cpus = DatasetSnapshots.apply(vendor_cpus, delta)
+
+        return vendor_cpus
+
+    def report(self, version: Optional[int] = None) -> str:
+        if version is None:
+            version = self.latest_version
+        with open(self._path(DatasetSnapshots.report_filename.format(version)), 'r', encoding='utf-8') as f:
+            return f.read()
+
+    @staticmethod
+    def diff(old_vendor_cpus: dict, new_vendor_cpus: dict) -> dict:
+        delta = {
+            'vendors': {},
+            'vendor_order': list(new_vendor_cpus.keys()),
+        }
+        for vendor in set(old_vendor_cpus.keys()) | set(new_vendor_cpus.keys()):
+            old_cpus = DatasetSnapshots._cpus_by_url(old_vendor_cpus.get(vendor, []))
+            new_cpus = DatasetSnapshots._cpus_by_url(new_vendor_cpus.get(vendor, []))
+            vendor_delta = {
+                'added': {key: cpu for key, cpu in new_cpus.items() if key not in old_cpus},
+                'removed': [key for key in old_cpus if key not in new_cpus],
+                'changed': {key: cpu for key, cpu in new_cpus.items() if key in old_cpus and old_cpus[key] != cpu},
+                'order': None,
+            }
+
+            # Store the row order only if replaying the delta wouldn't produce it
+            replayed_keys = [key for key in old_cpus if key in new_cpus] + list(vendor_delta['added'].keys())
+            if replayed_keys != list(new_cpus.keys()):
+                vendor_delta['order'] = list(new_cpus.keys())
+            delta['vendors'][vendor] = vendor_delta
+
+        return delta
+
+    @staticmethod
+    def apply(vendor_cpus: dict, delta: dict) -> dict:
+        new_vendor_cpus = {}
+        for vendor in delta['vendor_order']:
+            cpus = DatasetSnapshots._cpus_by_url(vendor_cpus.get(vendor, []))
+            vendor_delta = delta['vendors'][vendor]
+            for key in vendor_delta['removed']:
+                del cpus[key]
+            cpus.update(vendor_delta['changed'])
+            cpus.update(vendor_delta['added'])
+            if vendor_delta['order']:
+                cpus = {key: cpus[key] for key in vendor_delta['order']}
+            new_vendor_cpus[vendor] = list(cpus.values())
+
+        return new_vendor_cpus
+
+    @staticmethod
+    def change_report(delta: dict, old_vendor_cpus: dict) -> str:
+        lines = ["Dataset snapshot version {}, {}".format(delta['version'], delta['timestamp'].isoformat())]
+        for vendor in sorted(delta['vendors'].keys()):
+            vendor_delta = delta['vendors'][vendor]
+            lines.append("")
+            lines.append("{}: {} added, {} removed, {} changed".format(
+                vendor, len(vendor_delta['added']), len(vendor_delta['removed']), len(vendor_delta['changed'])))
+            old_cpus = DatasetSnapshots._cpus_by_url(old_vendor_cpus.get(vendor, []))
+            for key, cpu in vendor_delta['added'].items():
+                lines.append("+ {} ({})".format(cpu[0], key[0]))
+            for key in vendor_delta['removed']:
+                lines.append("- {} ({})".format(old_cpus[key][0], key[0]))
+            for key, cpu in vendor_delta['changed'].items():
+                old_cpu = old_cpus[key]
+                changes = ["{}: {!r} -> {!r}".format(field, old_cpu[field_idx], cpu[field_idx])
+                           for field_idx, field in enumerate(DatasetSnapshots.CPU_FIELDS)
+                           if old_cpu[field_idx] != cpu[field_idx]]
+                lines.append("* {} ({}): {}".format(cpu[0], key[0], ', '.join(changes)))
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _cpus_by_url(cpus: list) -> dict:
+        # Key: (URL, occurrence). Same CPU can be listed more than once, snapshots must keep all rows.
+        cpus_by_url = {}
+        occurrences = {}
+        for cpu in cpus:
+            url = cpu[DatasetSnapshots.URL_IDX]
+            occurrences[url] = occurrences.get(url, 0) + 1
+            cpus_by_url[(url, occurrences[url] - 1)] = cpu
+
+        return cpus_by_url
+
+    def _path(self, filename: str) -> str:
+        return "{}/{}".format(self.snapshot_dir, filename)
+
+    def _load(self, filename: str, default):
+        path = self._path(filename)
+        if not os.path.exists(path):
+            return default
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    def _save(self, filename: str, data) -> None:
+        # Write into a temporary file first, a crash must not leave half-written history behind
+        path = self._path(filename)
+        tmp_path = "{}.tmp".format(path)
+        with open(tmp_path, 'wb') as f:
+            # Pickle the 'data' dictionary using the highest protocol available.
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)